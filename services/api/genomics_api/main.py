@@ -1,20 +1,58 @@
+import atexit
+import base64
+import binascii
+import functools
+import hashlib
+import io
 import os
-import json
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
+from cachetools import TTLCache
 import duckdb
 import orjson
-from fastapi import FastAPI, HTTPException
-from opensearchpy import OpenSearch
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from fastapi import Depends, FastAPI, HTTPException, Query
+from opensearchpy import NotFoundError, OpenSearch
 from pydantic import BaseModel, Field
 from starlette.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 DATA_ROOT = os.getenv("DATA_ROOT", "/data/parquet")
 OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "http://localhost:9200")
 INDEX_NAME = os.getenv("INDEX_NAME", "variants")
 REPORTING_URL = os.getenv("REPORTING_URL", "")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+# Above this many chromosomes a single recursive glob is cheaper than per-partition globs
+MAX_CHROM_GLOBS = int(os.getenv("MAX_CHROM_GLOBS", "8"))
+# Above this many IDs, lookups semi-join a registered ID table instead of an IN list
+SEMI_JOIN_MIN_IDS = int(os.getenv("SEMI_JOIN_MIN_IDS", "256"))
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "16384"))
+TRACK_TOTAL_HITS = int(os.getenv("TRACK_TOTAL_HITS", "10000"))
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", "1024"))
+FACET_CACHE_TTL = float(os.getenv("FACET_CACHE_TTL", "60"))
+
+# Columns returned for variant rows; keeps DuckDB from decoding unused columns
+VARIANT_COLUMNS = (
+    "variant_id",
+    "chrom",
+    "pos",
+    "ref",
+    "alt",
+    "rsid",
+    "qual",
+    "filters",
+    "csq",
+)
+
+
+class OrjsonResponse(JSONResponse):
+    # Serializes straight to bytes with orjson instead of stdlib json
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
 
 # DuckDB connection (lazy)
 _duckdb_conn: Optional[duckdb.DuckDBPyConnection] = None
@@ -25,11 +63,31 @@ def get_duckdb() -> duckdb.DuckDBPyConnection:
     if _duckdb_conn is None:
         _duckdb_conn = duckdb.connect(database=":memory:")
         _duckdb_conn.execute("INSTALL httpfs; LOAD httpfs;")
+        # reuse parsed Parquet footers across requests
+        _duckdb_conn.execute(f"SET threads={DUCKDB_THREADS}; SET enable_object_cache=true;")
     return _duckdb_conn
 
 
+# OpenSearch client (lazy, shared); keeps pooled keep-alive connections across requests
+_os_client: Optional[OpenSearch] = None
+_os_client_lock = threading.Lock()
+
+
 def get_os() -> OpenSearch:
-    return OpenSearch(hosts=[OPENSEARCH_URL], verify_certs=False)
+    global _os_client
+    if _os_client is None:
+        with _os_client_lock:
+            if _os_client is None:
+                _os_client = OpenSearch(
+                    hosts=[OPENSEARCH_URL],
+                    verify_certs=False,
+                    http_compress=True,
+                    pool_maxsize=32,
+                    retry_on_timeout=True,
+                    max_retries=2,
+                    timeout=10,
+                )
+    return _os_client
 
 
 class PageRequest(BaseModel):
@@ -67,7 +125,12 @@ class VariantExportRequest(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
-app = FastAPI(title="Genomics API", version="0.1.0")
+class VariantBatchRequest(BaseModel):
+    project_id: str
+    variant_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+app = FastAPI(title="Genomics API", version="0.1.0", default_response_class=OrjsonResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -83,9 +146,8 @@ def healthz() -> Dict[str, str]:
 
 
 @app.post("/api/filter/query")
-def filter_query(req: FilterRequest):
+def filter_query(req: FilterRequest, client: OpenSearch = Depends(get_os)):
     # Use OpenSearch for doc IDs by filter, then fetch Parquet rows via DuckDB
-    client = get_os()
     must: List[Dict[str, Any]] = []
     if req.filters:
         must = _build_os_query(req.filters)
@@ -94,59 +156,117 @@ def filter_query(req: FilterRequest):
         body["sort"] = req.sort
     size = req.page.size
     if req.page.cursor:
-        body["search_after"] = json.loads(req.page.cursor)
+        body["search_after"] = _decode_cursor(req.page.cursor)
     body["size"] = size
-    body["track_total_hits"] = True
+    # only _id and sort values are used from hits
+    body["_source"] = False
+    # exact counts past the cap are expensive; total becomes a lower bound ("gte")
+    body["track_total_hits"] = TRACK_TOTAL_HITS
 
     res = client.search(index=_index_for_project(req.project_id), body=body)
     hits = res["hits"]["hits"]
     total = res["hits"]["total"]["value"]
-    next_cursor = hits[-1]["sort"] if hits else None
+    total_relation = res["hits"]["total"]["relation"]
+    next_cursor = hits[-1].get("sort") if hits else None
     variant_ids = [h["_id"] for h in hits]
 
     # Fetch rows from Parquet via DuckDB
     if variant_ids:
-        df = _fetch_variants_from_parquet(req.project_id, variant_ids)
-        rows = json.loads(df.to_json(orient="records"))
+        table = _fetch_variants_from_parquet(req.project_id, variant_ids)
+        rows = table.to_pylist()
     else:
         rows = []
 
-    return JSONResponse(
+    return OrjsonResponse(
         content={
             "total": total,
-            "next_cursor": json.dumps(next_cursor) if next_cursor else None,
+            "total_relation": total_relation,
+            "next_cursor": _encode_cursor(next_cursor) if next_cursor else None,
             "items": rows,
         }
     )
 
 
+def _encode_cursor(sort_values: List[Any]) -> str:
+    # opaque to clients: base64url over the orjson-encoded search_after values
+    return base64.urlsafe_b64encode(orjson.dumps(sort_values)).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> List[Any]:
+    # reject garbage here rather than letting OpenSearch fail the search with a 500
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeEncodeError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
 @app.post("/api/facets")
-def facet_counts(req: FilterRequest):
-    client = get_os()
+def facet_counts(req: FilterRequest, nocache: bool = False, client: OpenSearch = Depends(get_os)):
     must: List[Dict[str, Any]] = []
     if req.filters:
         must = _build_os_query(req.filters)
+    # fields are keyword with eager global ordinals (see ingestor/index_bootstrap.py),
+    # so the default ordinal-based terms execution is already warm on every shard
     aggs = {
-        "by_gene": {"terms": {"field": "csq.symbol.keyword", "size": 10000}},
-        "by_consequence": {"terms": {"field": "csq.consequence.keyword", "size": 10000}},
-        "by_clinsig": {"terms": {"field": "clinvar.clinsig.keyword", "size": 1000}},
+        "by_gene": {
+            "terms": {"field": "csq.symbol", "size": 1000, "shard_size": 2000}
+        },
+        "by_consequence": {
+            "terms": {"field": "csq.consequence", "size": 1000, "shard_size": 2000}
+        },
+        "by_clinsig": {
+            "terms": {"field": "clinvar.clinsig", "size": 1000, "min_doc_count": 1}
+        },
     }
     body = {"size": 0, "query": {"bool": {"must": must}}, "aggs": aggs}
-    res = client.search(index=_index_for_project(req.project_id), body=body)
+    index = _index_for_project(req.project_id)
+    key = _facet_cache_key(index, body)
+    if not nocache:
+        with _facet_cache_lock:
+            cached = _facet_cache.get(key)
+        if cached is not None:
+            return cached
+    res = client.search(index=index, body=body)
+    with _facet_cache_lock:
+        _facet_cache[key] = res["aggregations"]
     return res["aggregations"]
 
 
 @app.get("/api/variant/{project_id}/{variant_id}")
-def variant_detail(project_id: str, variant_id: str):
-    df = _fetch_variants_from_parquet(project_id, [variant_id])
-    if df.empty:
+def variant_detail(
+    project_id: str,
+    variant_id: str,
+    source: str = Query("parquet", pattern="^(parquet|index)$"),
+    client: OpenSearch = Depends(get_os),
+):
+    if source == "index":
+        # indexed doc only: a direct get by _id, no Parquet scan
+        try:
+            return client.get(index=_index_for_project(project_id), id=variant_id)["_source"]
+        except NotFoundError:
+            raise HTTPException(status_code=404, detail="Variant not found")
+    table = _fetch_variants_from_parquet(project_id, [variant_id])
+    if table.num_rows == 0:
         raise HTTPException(status_code=404, detail="Variant not found")
-    return json.loads(df.to_json(orient="records"))[0]
+    return table.to_pylist()[0]
+
+
+@app.post("/api/variants/batch")
+def variants_batch(req: VariantBatchRequest, client: OpenSearch = Depends(get_os)):
+    # mget is a direct lookup by _id: no query parsing, scoring or sorting
+    res = client.mget(index=_index_for_project(req.project_id), body={"ids": req.variant_ids})
+    docs = res["docs"]
+    return {
+        "items": [d["_source"] for d in docs if d.get("found")],
+        "missing": [d["_id"] for d in docs if not d.get("found")],
+    }
 
 
 @app.post("/api/export")
 def export_variants(req: VariantExportRequest):
-    df = _fetch_variants_from_parquet(req.project_id, req.variant_ids)
     export_id = req.export_id or f"exp-{int(time.time()*1000)}"
     # Audit log
     _write_audit({
@@ -156,57 +276,265 @@ def export_variants(req: VariantExportRequest):
         "metadata": req.metadata,
         "timestamp": time.time(),
     })
+    # rows are streamed in Arrow record batches; the audit record is written first
+    schema, batches = _open_variant_batches(req.project_id, req.variant_ids)
     if req.format.upper() == "CSV":
-        return JSONResponse(
-            media_type="text/csv",
-            content=df.to_csv(index=False),
-        )
+        return StreamingResponse(_csv_stream(schema, batches), media_type="text/csv")
     # default JSON
-    return JSONResponse(content=json.loads(df.to_json(orient="records")))
+    return StreamingResponse(_json_stream(batches), media_type="application/json")
+
+
+# Facet aggregation results keyed by a hash of (index, canonical query body)
+_facet_cache: TTLCache = TTLCache(maxsize=FACET_CACHE_SIZE, ttl=FACET_CACHE_TTL)
+_facet_cache_lock = threading.Lock()
+
+
+def _facet_cache_key(index: str, body: Dict[str, Any]) -> str:
+    canonical = orjson.dumps({"index": index, "body": body}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
 
 
 def _index_for_project(project_id: str) -> str:
+    # Alias the ingestor repoints to a versioned index once it is fully built
+    # (see ingestor/index_bootstrap.py); projects not re-ingested since index
+    # versioning still have a plain index under this name
     return f"{INDEX_NAME}-{project_id}".lower()
 
 
-def _build_os_query(group: FilterGroup) -> List[Dict[str, Any]]:
-    def clause_to_query(c: FilterClause) -> Dict[str, Any]:
-        op = c.op.lower()
-        if op in {"eq", "term"}:
-            return {"term": {c.field: c.value}}
-        if op in {"in"}:
-            return {"terms": {c.field: c.value}}
-        if op in {"lt", "lte", "gt", "gte"}:
-            return {"range": {c.field: {op: c.value}}}
-        if op in {"match"}:
-            return {"match": {c.field: c.value}}
-        raise HTTPException(400, f"Unsupported op: {c.op}")
+# FilterClause.op -> OpenSearch query builder
+_OPS: Dict[str, Callable[[str, Any], Dict[str, Any]]] = {
+    "eq": lambda f, v: {"term": {f: v}},
+    "term": lambda f, v: {"term": {f: v}},
+    "in": lambda f, v: {"terms": {f: v}},
+    "lt": lambda f, v: {"range": {f: {"lt": v}}},
+    "lte": lambda f, v: {"range": {f: {"lte": v}}},
+    "gt": lambda f, v: {"range": {f: {"gt": v}}},
+    "gte": lambda f, v: {"range": {f: {"gte": v}}},
+    "match": lambda f, v: {"match": {f: v}},
+}
+
 
+def _group_to_query(group: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     sub = []
-    for c in group.clauses:
-        sub.append(clause_to_query(c))
-    for g in group.groups:
-        sub.append({"bool": {"must" if g.op.upper()=="AND" else "should": _build_os_query(g)}})
-    key = "must" if group.op.upper() == "AND" else "should"
-    return [{"bool": {key: sub}}] if sub else []
+    for c in group["clauses"]:
+        build = _OPS.get(c["op"].lower())
+        if build is None:
+            raise HTTPException(400, f"Unsupported op: {c['op']}")
+        sub.append(build(c["field"], c["value"]))
+    for g in group["groups"]:
+        # an empty subgroup matches everything
+        sub.append(_group_to_query(g) or {"match_all": {}})
+    if not sub:
+        return None
+    if len(sub) == 1:
+        return sub[0]
+    key = "must" if group["op"].upper() == "AND" else "should"
+    return {"bool": {key: sub}}
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_filters(canonical: bytes) -> List[Dict[str, Any]]:
+    query = _group_to_query(orjson.loads(canonical))
+    return [query] if query is not None else []
+
+
+def _build_os_query(group: FilterGroup) -> List[Dict[str, Any]]:
+    # Memoized by the group's canonical JSON; the returned DSL is shared, do not mutate it
+    return _compile_filters(orjson.dumps(group.model_dump(), option=orjson.OPT_SORT_KEYS))
+
+
+def _chroms_from_ids(variant_ids: Sequence[str]) -> Set[str]:
+    # variant IDs are "chrom:pos:ref>alt"; contigs may contain ":" themselves
+    # (e.g. HLA-A*01:01:01:01), so split from the right
+    return {v.rsplit(":", 2)[0] for v in variant_ids}
+
 
+def _positions_from_ids(variant_ids: Sequence[str]) -> Optional[List[int]]:
+    try:
+        return sorted({int(v.rsplit(":", 2)[1]) for v in variant_ids})
+    except (IndexError, ValueError):
+        return None
 
-def _fetch_variants_from_parquet(project_id: str, variant_ids: List[str]):
-    conn = get_duckdb()
+
+def _parquet_globs(parquet_root: str, variant_ids: Sequence[str]) -> List[str]:
+    full_glob = [f"{parquet_root}/**/*.parquet"]
+    chroms = _chroms_from_ids(variant_ids)
+    if len(chroms) > MAX_CHROM_GLOBS or "://" in parquet_root:
+        # remote roots (httpfs) cannot be listed locally
+        return full_glob
+    if not os.path.isdir(parquet_root):
+        return []
+    entries = os.listdir(parquet_root)
+    # variant IDs are lowercased, partition directories keep the original case
+    partitions = {e.split("=", 1)[1].lower(): e for e in entries if e.startswith("chrom=")}
+    return [f"{parquet_root}/{partitions[c]}/**/*.parquet" for c in sorted(chroms) if c in partitions]
+
+
+def _variants_query(
+    project_id: str, variant_ids: List[str], columns: Sequence[str]
+) -> Optional[Tuple[str, List[Any], Optional[pa.Table]]]:
+    # Returns (sql, params, ids table to register), or None when no partition can contain the IDs
     parquet_root = os.path.join(DATA_ROOT, project_id)
-    # Read Parquet and filter by variant_id
+    globs = _parquet_globs(parquet_root, variant_ids)
+    if not globs:
+        return None
+    # Read only the requested columns from the matching chrom partitions;
+    # the pos predicate lets row-group min/max stats skip data
+    cols = ", ".join(f'"{c}"' for c in columns)
+    params: List[Any] = [globs]
+    ids: Optional[pa.Table] = None
+    if len(variant_ids) > SEMI_JOIN_MIN_IDS:
+        # large selections: hash semi-join against a registered Arrow table
+        # instead of evaluating a huge IN list per row
+        ids = pa.table({"variant_id": pa.array(variant_ids, type=pa.string())})
+        join = "SEMI JOIN _variant_ids USING (variant_id)"
+        predicates = []
+    else:
+        join = ""
+        predicates = ["variant_id IN (SELECT unnest(?))"]
+        params.append(list(variant_ids))
+    positions = _positions_from_ids(variant_ids)
+    if positions is not None:
+        predicates.append("pos IN (SELECT unnest(?))")
+        params.append(positions)
     query = f"""
-        SELECT *
-        FROM read_parquet('{parquet_root}/**/*.parquet', hive_partitioning=1)
-        WHERE variant_id IN ({','.join([repr(v) for v in variant_ids])})
+        SELECT {cols}
+        FROM read_parquet(?, hive_partitioning=1, hive_types={{'chrom': VARCHAR, 'year_month': VARCHAR}}) v
+        {join}
+        {"WHERE " + " AND ".join(predicates) if predicates else ""}
     """
-    return conn.execute(query).df()
+    return query, params, ids
+
+
+def _execute_variants_query(
+    cursor: duckdb.DuckDBPyConnection, query: Tuple[str, List[Any], Optional[pa.Table]]
+) -> duckdb.DuckDBPyConnection:
+    sql, params, ids = query
+    if ids is not None:
+        # registered views are local to the cursor and go away when it is closed
+        cursor.register("_variant_ids", ids)
+    return cursor.execute(sql, params)
+
+
+def _fetch_variants_from_parquet(
+    project_id: str,
+    variant_ids: List[str],
+    columns: Sequence[str] = VARIANT_COLUMNS,
+) -> pa.Table:
+    query = _variants_query(project_id, variant_ids, columns)
+    if query is None:
+        return pa.table({c: pa.array([]) for c in columns})
+    # a cursor per call keeps concurrent requests off each other's results
+    cursor = get_duckdb().cursor()
+    try:
+        return _execute_variants_query(cursor, query).fetch_arrow_table()
+    finally:
+        cursor.close()
+
+
+def _open_variant_batches(
+    project_id: str,
+    variant_ids: List[str],
+    columns: Sequence[str] = VARIANT_COLUMNS,
+) -> Tuple[pa.Schema, Iterator[pa.RecordBatch]]:
+    # The query runs here, before the response starts, so bind/IO errors still
+    # become error responses; only fetching the record batches is deferred
+    query = _variants_query(project_id, variant_ids, columns)
+    if query is None:
+        return pa.schema([(c, pa.null()) for c in columns]), iter(())
+    cursor = get_duckdb().cursor()
+    try:
+        reader = _execute_variants_query(cursor, query).fetch_record_batch(EXPORT_BATCH_ROWS)
+    except BaseException:
+        cursor.close()
+        raise
+    return reader.schema, _drain_batches(reader, cursor)
+
+
+def _drain_batches(reader: pa.RecordBatchReader, cursor: duckdb.DuckDBPyConnection) -> Iterator[pa.RecordBatch]:
+    # the stream outlives the request handler, so the cursor is closed
+    # only once the last batch has been consumed
+    try:
+        yield from reader
+    finally:
+        cursor.close()
+
+
+def _flatten_structs(table: pa.Table) -> pa.Table:
+    # CSV has no nested types; struct columns such as csq become csq.<FIELD>
+    while any(pa.types.is_struct(f.type) for f in table.schema):
+        table = table.flatten()
+    return table
+
+
+def _csv_stream(schema: pa.Schema, batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    buf = io.BytesIO()
+    # the header comes from the query schema, so an export with no rows still has one
+    writer = pa_csv.CSVWriter(buf, _flatten_structs(schema.empty_table()).schema)
+    for batch in batches:
+        writer.write_table(_flatten_structs(pa.Table.from_batches([batch])))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    writer.close()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _json_stream(batches: Iterable[pa.RecordBatch]) -> Iterator[bytes]:
+    # one JSON array, emitted as comma-joined fragments of each batch
+    yield b"["
+    sep = b""
+    for batch in batches:
+        if batch.num_rows:
+            yield sep + orjson.dumps(batch.to_pylist())[1:-1]
+            sep = b","
+    yield b"]"
+
+
+class _AuditWriter:
+    # Keeps the NDJSON audit log open with a buffered writer; a daemon thread
+    # flushes it periodically and atexit flushes/closes it on shutdown
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._fh: Optional[io.BufferedWriter] = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def write(self, event: Dict[str, Any]):
+        line = orjson.dumps(event) + b"\n"
+        with self._lock:
+            if self._fh is None:
+                # "ab" opens with O_APPEND
+                self._fh = open(self.path, "ab", buffering=1 << 17)
+                threading.Thread(target=self._flush_loop, name="audit-flush", daemon=True).start()
+            self._fh.write(line)
+
+    def flush(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+
+_audit_writer = _AuditWriter(os.path.join(DATA_ROOT, "audit.log.ndjson"))
+atexit.register(_audit_writer.close)
 
 
 def _write_audit(event: Dict[str, Any]):
-    audit_path = os.path.join(DATA_ROOT, "audit.log.ndjson")
-    with open(audit_path, "a", encoding="utf-8") as fh:
-        fh.write(orjson.dumps(event).decode("utf-8") + "\n")
+    _audit_writer.write(event)
 
 
 def run():
@@ -0,0 +1,38 @@
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+from genomics_api.main import _decode_cursor, _encode_cursor
+
+
+def test_cursor_round_trip():
+    """Test that search_after values survive encoding."""
+    # arrange:
+    sort_values = [123456, "1:123456:a>g", 0.5]
+    # act:
+    cursor = _encode_cursor(sort_values)
+    # assert:
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+    assert _decode_cursor(cursor) == sort_values
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not base64!",
+        "[123]",
+        "é",
+        base64.urlsafe_b64encode(b"{not json").decode(),
+        base64.urlsafe_b64encode(b'{"pos": 1}').decode(),
+        base64.urlsafe_b64encode(b"[]").decode(),
+    ],
+)
+def test_cursor_rejected(cursor: str):
+    """Test that malformed cursors are rejected with 400."""
+    # act:
+    with pytest.raises(HTTPException) as excinfo:
+        _decode_cursor(cursor)
+    # assert:
+    assert excinfo.value.status_code == 400
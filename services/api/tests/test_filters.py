@@ -0,0 +1,134 @@
+import pytest
+from fastapi import HTTPException
+
+from genomics_api.main import FilterGroup, _build_os_query
+
+
+def _compile(group: dict):
+    return _build_os_query(FilterGroup.model_validate(group))
+
+
+def test_and_group():
+    """Test that an AND group becomes a bool/must over its clauses."""
+    # act:
+    query = _compile(
+        {
+            "op": "AND",
+            "clauses": [
+                {"field": "csq.symbol", "op": "term", "value": "BRCA2"},
+                {"field": "pos", "op": "gte", "value": 100},
+            ],
+        }
+    )
+    # assert:
+    assert query == [
+        {"bool": {"must": [{"term": {"csq.symbol": "BRCA2"}}, {"range": {"pos": {"gte": 100}}}]}}
+    ]
+
+
+def test_or_group():
+    """Test that an OR group becomes a bool/should over its clauses."""
+    # act:
+    query = _compile(
+        {
+            "op": "or",
+            "clauses": [
+                {"field": "csq.consequence", "op": "in", "value": ["missense_variant", "stop_gained"]},
+                {"field": "clinvar.clinsig", "op": "EQ", "value": "pathogenic"},
+            ],
+        }
+    )
+    # assert:
+    assert query == [
+        {
+            "bool": {
+                "should": [
+                    {"terms": {"csq.consequence": ["missense_variant", "stop_gained"]}},
+                    {"term": {"clinvar.clinsig": "pathogenic"}},
+                ]
+            }
+        }
+    ]
+
+
+def test_single_member_group_is_unwrapped():
+    """Test that a group with one member compiles to that member without a bool wrapper."""
+    # act:
+    query = _compile({"op": "OR", "clauses": [{"field": "csq.symbol", "op": "match", "value": "brca"}]})
+    # assert:
+    assert query == [{"match": {"csq.symbol": "brca"}}]
+
+
+def test_nested_groups():
+    """Test nested AND/OR groups."""
+    # act:
+    query = _compile(
+        {
+            "op": "AND",
+            "clauses": [{"field": "chrom", "op": "eq", "value": "1"}],
+            "groups": [
+                {
+                    "op": "OR",
+                    "clauses": [
+                        {"field": "csq.impact", "op": "eq", "value": "HIGH"},
+                        {"field": "population.gnomad_af", "op": "lt", "value": 0.01},
+                    ],
+                }
+            ],
+        }
+    )
+    # assert:
+    assert query == [
+        {
+            "bool": {
+                "must": [
+                    {"term": {"chrom": "1"}},
+                    {
+                        "bool": {
+                            "should": [
+                                {"term": {"csq.impact": "HIGH"}},
+                                {"range": {"population.gnomad_af": {"lt": 0.01}}},
+                            ]
+                        }
+                    },
+                ]
+            }
+        }
+    ]
+
+
+def test_empty_groups():
+    """Test that an empty subgroup matches everything and an empty top-level group adds nothing."""
+    # act:
+    nested = _compile(
+        {
+            "op": "AND",
+            "clauses": [{"field": "chrom", "op": "eq", "value": "1"}],
+            "groups": [{"op": "OR"}],
+        }
+    )
+    top = _compile({"op": "AND"})
+    # assert:
+    assert nested == [{"bool": {"must": [{"term": {"chrom": "1"}}, {"match_all": {}}]}}]
+    assert top == []
+
+
+def test_compiled_query_is_memoized():
+    """Test that equal groups share one compiled query regardless of key order."""
+    # arrange:
+    clause = {"field": "chrom", "op": "eq", "value": "1"}
+    # act:
+    first = _compile({"op": "AND", "clauses": [clause]})
+    second = _compile({"clauses": [dict(reversed(list(clause.items())))], "op": "AND"})
+    # assert:
+    assert first is second
+
+
+def test_unsupported_op():
+    """Test that an unknown op is rejected with 400."""
+    # act:
+    with pytest.raises(HTTPException) as excinfo:
+        _compile({"op": "AND", "clauses": [{"field": "pos", "op": "between", "value": [1, 2]}]})
+    # assert:
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Unsupported op: between"
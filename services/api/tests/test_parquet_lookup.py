@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from genomics_api import main
+
+HLA_CONTIG = "HLA-A*01:01:01:01"
+
+
+def _write_partition(root: Path, chrom: str, rows):
+    partition_dir = root / "p1" / f"chrom={chrom}" / "year_month=2026_10"
+    partition_dir.mkdir(parents=True)
+    table = pa.table(
+        {
+            "project_id": ["p1"] * len(rows),
+            "pos": [pos for pos, _ in rows],
+            "ref": ["A"] * len(rows),
+            "alt": ["G"] * len(rows),
+            "variant_id": [f"{chrom}:{pos}:a>g".lower() for pos, _ in rows],
+            "rsid": [None] * len(rows),
+            "qual": [None] * len(rows),
+            "filters": ["PASS"] * len(rows),
+            "csq": [{"SYMBOL": symbol} for _, symbol in rows],
+        },
+        schema=pa.schema(
+            [
+                ("project_id", pa.string()),
+                ("pos", pa.int64()),
+                ("ref", pa.string()),
+                ("alt", pa.string()),
+                ("variant_id", pa.string()),
+                ("rsid", pa.string()),
+                ("qual", pa.float64()),
+                ("filters", pa.string()),
+                ("csq", pa.struct([("SYMBOL", pa.string())])),
+            ]
+        ),
+    )
+    pq.write_table(table, partition_dir / "part-0.parquet")
+
+
+@pytest.fixture
+def data_root(tmp_path: Path, monkeypatch: MonkeyPatch) -> Path:
+    _write_partition(tmp_path, "1", [(10, "BRCA2"), (20, "TP53")])
+    _write_partition(tmp_path, "X", [(10, "DMD")])
+    _write_partition(tmp_path, HLA_CONTIG, [(5, "HLA-A")])
+    monkeypatch.setattr(main, "DATA_ROOT", str(tmp_path))
+    # plain local connection; get_duckdb() would try to install httpfs
+    monkeypatch.setattr(main, "_duckdb_conn", duckdb.connect(":memory:"))
+    return tmp_path
+
+
+def test_positions_from_ids():
+    """Test position parsing, including contigs that contain ":"."""
+    # act:
+    positions = main._positions_from_ids(["1:20:a>g", "1:10:a>g", f"{HLA_CONTIG}:5:a>g".lower()])
+    # assert:
+    assert positions == [5, 10, 20]
+
+
+def test_positions_from_ids_malformed():
+    """Test that a malformed id disables position pruning."""
+    # act:
+    positions = main._positions_from_ids(["1:10:a>g", "nope"])
+    # assert:
+    assert positions is None
+
+
+def test_parquet_globs_per_chrom(data_root: Path):
+    """Test that only the requested chrom partitions are globbed, matched case-insensitively."""
+    # act:
+    globs = main._parquet_globs(str(data_root / "p1"), ["x:10:a>g", f"{HLA_CONTIG}:5:a>g".lower(), "7:1:a>g"])
+    # assert:
+    assert globs == [
+        f"{data_root}/p1/chrom={HLA_CONTIG}/**/*.parquet",
+        f"{data_root}/p1/chrom=X/**/*.parquet",
+    ]
+
+
+def test_parquet_globs_full_and_missing(data_root: Path, monkeypatch: MonkeyPatch):
+    """Test the full-glob fallback and a missing project directory."""
+    # arrange:
+    monkeypatch.setattr(main, "MAX_CHROM_GLOBS", 1)
+    # act:
+    full = main._parquet_globs(str(data_root / "p1"), ["1:10:a>g", "x:10:a>g"])
+    missing = main._parquet_globs(str(data_root / "nope"), ["1:10:a>g"])
+    # assert:
+    assert full == [f"{data_root}/p1/**/*.parquet"]
+    assert missing == []
+
+
+@pytest.mark.parametrize("max_chrom_globs", [8, 0])
+def test_fetch_variants_on_contig_with_colons(data_root: Path, monkeypatch: MonkeyPatch, max_chrom_globs: int):
+    """Test lookups on a contig containing ":" via per-chrom and full globs."""
+    # arrange:
+    monkeypatch.setattr(main, "MAX_CHROM_GLOBS", max_chrom_globs)
+    variant_id = f"{HLA_CONTIG}:5:a>g".lower()
+    # act:
+    table = main._fetch_variants_from_parquet("p1", [variant_id, "1:20:a>g"])
+    # assert:
+    rows = sorted(table.to_pylist(), key=lambda r: r["variant_id"])
+    assert [(r["variant_id"], r["chrom"], r["pos"]) for r in rows] == [
+        ("1:20:a>g", "1", 20),
+        (variant_id, HLA_CONTIG, 5),
+    ]
+    assert rows[1]["csq"] == {"SYMBOL": "HLA-A"}
@@ -1,18 +1,56 @@
 import argparse
 import gzip
+import multiprocessing.util
 import os
 import re
 import sys
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, Iterable, List, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import orjson
-import pandas as pd
 import pyarrow as pa
-import pyarrow.dataset as ds
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from opensearchpy import OpenSearch, helpers
+from opensearchpy.serializer import JSONSerializer
+
+from ingestor.index_bootstrap import (
+    alias_for_project,
+    ensure_index,
+    index_for_project,
+    point_alias,
+    start_backfill,
+    wait_for_backfill,
+)
 
 CSQ_KEY = "CSQ"
+READ_CHUNK_SIZE = 1 << 20
+# Unit of work handed to a pool worker: a block of whole VCF lines
+MORSEL_SIZE = 8 << 20
+# Low-cardinality columns that compress far better dictionary-encoded. chrom and
+# year_month are partition directories, not file columns; missing names are ignored.
+DICTIONARY_COLUMNS = [
+    "project_id",
+    "ref",
+    "alt",
+    "filters",
+    "csq.SYMBOL",
+    "csq.Consequence",
+    "csq.IMPACT",
+    "csq.BIOTYPE",
+]
+PARQUET_WRITE_OPTIONS: Dict[str, Any] = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "use_dictionary": DICTIONARY_COLUMNS,
+    "write_statistics": True,
+    "data_page_size": 1 << 20,
+    "write_batch_size": 8192,
+}
+ROW_GROUP_SIZE = 128_000
+PARTITION_COLUMNS = ["chrom", "year_month"]
 
 
 def parse_args() -> argparse.Namespace:
@@ -23,13 +61,62 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument("--opensearch-url", default="http://localhost:9200")
     ap.add_argument("--index-name", default="variants")
     ap.add_argument("--batch-size", type=int, default=5000)
+    ap.add_argument(
+        "--bulk-threads",
+        type=int,
+        default=4,
+        help="Concurrent OpenSearch bulk requests in total; split across --workers, "
+        "but every worker keeps at least one, so the effective total is max(bulk-threads, workers)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Parser processes; 1 runs the whole pipeline in-process",
+    )
     return ap.parse_args()
 
 
+class OrjsonSerializer(JSONSerializer):
+    # bulk helpers serialize every action line through this; orjson is much faster than stdlib json
+    def dumps(self, data: Any) -> str:
+        if isinstance(data, str):
+            return data
+        return orjson.dumps(data).decode("utf-8")
+
+    def loads(self, s: str) -> Any:
+        return orjson.loads(s)
+
+
 def open_maybe_gzip(path: str):
     if path.endswith(".gz"):
-        return gzip.open(path, "rt")
-    return open(path, "rt")
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_header_lines(fh) -> List[str]:
+    # consume only "#" lines so fh is left at the first body line
+    header_lines: List[str] = []
+    while fh.peek(1)[:1] == b"#":
+        header_lines.append(fh.readline().decode("utf-8"))
+    return header_lines
+
+
+def iter_line_blocks(fh, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield ~chunk_size blocks of the stream, each ending on a line boundary."""
+    tail = b""
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        end = chunk.rfind(b"\n")
+        if end == -1:
+            tail += chunk
+            continue
+        yield tail + chunk[: end + 1]
+        tail = chunk[end + 1 :]
+    if tail:
+        yield tail
 
 
 def parse_header_for_csq_order(lines: Iterable[str]) -> Tuple[List[str], List[str]]:
@@ -47,34 +134,187 @@ def parse_header_for_csq_order(lines: Iterable[str]) -> Tuple[List[str], List[st
     return header_lines, csq_fields
 
 
+def csq_field_index(csq_order: List[str]) -> Dict[str, int]:
+    return {name: i for i, name in enumerate(csq_order)}
+
+
 def compute_variant_id(chrom: str, pos: str, ref: str, alt: str) -> str:
     return f"{chrom}:{pos}:{ref}>{alt}".lower()
 
 
-def write_parquet(project_id: str, records: List[Dict[str, object]], root: str):
-    if not records:
-        return
-    df = pd.DataFrame.from_records(records)
-    table = pa.Table.from_pandas(df, preserve_index=False)
-    # partition by chromosome and year_month
-    year_month = datetime.utcnow().strftime("%Y_%m")
-    partitioning = ds.partitioning(pa.schema([("chrom", pa.string()), ("year_month", pa.string())]))
-    outdir = os.path.join(root, project_id)
-    ds.write_dataset(
-        table,
-        base_dir=outdir,
-        format="parquet",
-        partitioning=partitioning,
-        basename_template="part-{i}.parquet",
-        partition_cols=["chrom", "year_month"],
-        existing_data_behavior="overwrite_or_ignore",
-    )
+class VariantBatch:
+    """Column-oriented buffer of parsed variants: one list per output column."""
+
+    def __init__(self, project_id: str, month: str, csq_order: List[str]):
+        self.project_id = project_id
+        self.month = month
+        self.csq_order = csq_order
+        self.chrom: List[str] = []
+        self.pos: List[int] = []
+        self.ref: List[str] = []
+        self.alt: List[str] = []
+        self.variant_id: List[str] = []
+        self.rsid: List[Optional[str]] = []
+        self.qual: List[Optional[float]] = []
+        self.filters: List[str] = []
+        # one column per CSQ field, in header order
+        self.csq: List[List[Optional[str]]] = [[] for _ in csq_order]
+        self.csq_index = csq_field_index(csq_order)
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def appenders(self) -> Tuple[Tuple[Callable[[Any], None], ...], List[Callable[[Any], None]]]:
+        # bound append methods for the parse loop: fixed columns, then one per CSQ field
+        fixed = (
+            self.chrom.append,
+            self.pos.append,
+            self.ref.append,
+            self.alt.append,
+            self.variant_id.append,
+            self.rsid.append,
+            self.qual.append,
+            self.filters.append,
+        )
+        return fixed, [col.append for col in self.csq]
+
+    def _csq_column(self, name: str) -> List[Optional[str]]:
+        i = self.csq_index.get(name)
+        return self.csq[i] if i is not None else [None] * len(self)
+
+    def to_table(self) -> pa.Table:
+        n = len(self)
+        csq = pa.StructArray.from_arrays(
+            [pa.array(col, type=pa.string()) for col in self.csq], names=self.csq_order
+        )
+        return pa.table(
+            {
+                "project_id": pa.repeat(pa.scalar(self.project_id, pa.string()), n),
+                "chrom": pa.array(self.chrom, type=pa.string()),
+                "pos": pa.array(self.pos, type=pa.int64()),
+                "ref": pa.array(self.ref, type=pa.string()),
+                "alt": pa.array(self.alt, type=pa.string()),
+                "variant_id": pa.array(self.variant_id, type=pa.string()),
+                "rsid": pa.array(self.rsid, type=pa.string()),
+                "qual": pa.array(self.qual, type=pa.float64()),
+                "filters": pa.array(self.filters, type=pa.string()),
+                "csq": csq,
+                "year_month": pa.repeat(pa.scalar(self.month, pa.string()), n),
+            }
+        )
+
+    def iter_docs(self) -> Iterator[Dict[str, object]]:
+        # minimal index docs, built lazily from the columns
+        columns = zip(
+            self.variant_id,
+            self.chrom,
+            self.pos,
+            self._csq_column("SYMBOL"),
+            self._csq_column("Consequence"),
+            self._csq_column("IMPACT"),
+        )
+        for variant_id, chrom, pos, symbol, consequence, impact in columns:
+            yield {
+                "variant_id": variant_id,
+                "chrom": chrom,
+                "pos": pos,
+                "csq": {"symbol": symbol, "consequence": consequence, "impact": impact},
+                "clinvar": {},
+                "population": {},
+            }
+
+
+class DatasetWriter:
+    """Long-lived Parquet writers, one file per hive (chrom, year_month) partition.
+
+    Batches are buffered per partition and written as ~row_group_size row
+    groups, so a run produces one file per partition instead of one per batch.
+    Only one partition is buffered at a time: rows for a new partition flush
+    the others first (VCFs are sorted by chrom, so those are finished), which
+    caps buffered rows at ~row_group_size for the whole writer.
+    """
+
+    def __init__(self, root: str, project_id: str, row_group_size: int = ROW_GROUP_SIZE):
+        self.outdir = os.path.join(root, project_id)
+        self.row_group_size = row_group_size
+        # unique per run so repeated ingests into a project never clobber each other
+        self.basename = f"part-{uuid.uuid4().hex}.parquet"
+        self._writers: Dict[Tuple[str, str], pq.ParquetWriter] = {}
+        self._pending: Dict[Tuple[str, str], List[pa.Table]] = {}
+        self._pending_rows: Dict[Tuple[str, str], int] = {}
+        self._pending_total = 0
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+    def write(self, batch: VariantBatch):
+        if not len(batch):
+            return
+        table = batch.to_table()
+        chroms = sorted(set(batch.chrom))
+        for chrom in chroms:
+            part = table if len(chroms) == 1 else table.filter(pc.equal(table["chrom"], chrom))
+            # partition values live in the directory names, not in the files
+            self._append((chrom, batch.month), part.drop_columns(PARTITION_COLUMNS))
+
+    def flush(self):
+        # write out every buffered partition
+        for key in list(self._pending):
+            self._flush(key)
+
+    def close(self):
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
 
+    def _append(self, key: Tuple[str, str], table: pa.Table):
+        if key not in self._pending:
+            for other in list(self._pending):
+                self._flush(other)
+        self._pending.setdefault(key, []).append(table)
+        self._pending_rows[key] = self._pending_rows.get(key, 0) + table.num_rows
+        self._pending_total += table.num_rows
+        if self._pending_total >= self.row_group_size:
+            self._flush(key)
 
-def index_opensearch(project_id: str, docs: List[Dict[str, object]], client: OpenSearch, index_name: str):
-    if not docs:
-        return
-    index = f"{index_name}-{project_id}".lower()
+    def _flush(self, key: Tuple[str, str]):
+        tables = self._pending.pop(key, None)
+        self._pending_total -= self._pending_rows.pop(key, 0)
+        if not tables:
+            return
+        table = pa.concat_tables(tables)
+        writer = self._writers.get(key)
+        if writer is None:
+            chrom, month = key
+            partition_dir = os.path.join(self.outdir, f"chrom={chrom}", f"year_month={month}")
+            os.makedirs(partition_dir, exist_ok=True)
+            writer = pq.ParquetWriter(
+                os.path.join(partition_dir, self.basename), table.schema, **PARQUET_WRITE_OPTIONS
+            )
+            self._writers[key] = writer
+        writer.write_table(table, row_group_size=self.row_group_size)
+
+
+def write_batches(batches: Iterable[VariantBatch], writer: DatasetWriter) -> Iterator[VariantBatch]:
+    # write each batch to Parquet, then pass it on for indexing
+    for batch in batches:
+        writer.write(batch)
+        yield batch
+
+
+def index_opensearch(
+    project_id: str,
+    batches: Iterable[VariantBatch],
+    client: OpenSearch,
+    index_name: str,
+    thread_count: int = 4,
+) -> int:
+    """Stream index docs for all batches through parallel_bulk; returns the number of failed docs."""
+    index = index_for_project(index_name, project_id)
 
     actions = (
         {
@@ -83,84 +323,197 @@ def index_opensearch(project_id: str, docs: List[Dict[str, object]], client: Ope
             "_id": d["variant_id"],
             "_source": d,
         }
-        for d in docs
+        for batch in batches
+        for d in batch.iter_docs()
+    )
+    failed = 0
+    for ok, item in helpers.parallel_bulk(
+        client,
+        actions,
+        thread_count=thread_count,
+        chunk_size=2000,
+        queue_size=thread_count,
+        raise_on_error=False,
+        request_timeout=120,
+    ):
+        if not ok:
+            if not failed:
+                print(f"ERROR: failed to index document: {item}", file=sys.stderr)
+            failed += 1
+    return failed
+
+
+def parse_vcf_body(
+    lines: Iterable[bytes], csq_order: List[str], project_id: str, month: str, batch_size: int
+) -> Iterator[VariantBatch]:
+    """Parse VCF body lines and yield a VariantBatch every batch_size variants."""
+    n_csq = len(csq_order)
+    no_csq: List[Optional[str]] = [None] * n_csq
+    csq_key = CSQ_KEY.encode("ascii")
+    batch = VariantBatch(project_id, month, csq_order)
+    # bound appends are unpacked once per batch, not per line
+    (
+        (add_chrom, add_pos, add_ref, add_alt, add_variant_id, add_rsid, add_qual, add_filters),
+        csq_appends,
+    ) = batch.appenders()
+    for raw in lines:
+        if not raw or raw.startswith(b"#"):
+            continue
+        # only the 8 fixed columns are needed; leave FORMAT/sample columns unsplit.
+        # Fields stay bytes and only the ones that are stored get decoded.
+        chrom_b, pos, _id, ref_b, alt_b, qual, flt, info = raw.split(b"\t", 8)[:8]
+        csq_raw = None
+        for kv in info.split(b";"):
+            k, sep, v = kv.partition(b"=")
+            if k == csq_key:
+                csq_raw = v if sep else None
+                break
+        first_csq: List[Optional[str]] = (
+            csq_raw.split(b",", 1)[0].decode("utf-8").split("|") if csq_raw else no_csq
+        )
+        if len(first_csq) < n_csq:
+            first_csq.extend(no_csq[len(first_csq) :])
+
+        chrom = chrom_b.decode("ascii")
+        ref = ref_b.decode("ascii")
+        alt = alt_b.decode("ascii")
+        add_chrom(chrom)
+        add_pos(int(pos))
+        add_ref(ref)
+        add_alt(alt)
+        add_variant_id(compute_variant_id(chrom, pos.decode("ascii"), ref, alt))
+        add_rsid(_id.decode("utf-8") if _id != b"." else None)
+        add_qual(float(qual) if qual not in (b".", b"") else None)
+        add_filters(flt.decode("utf-8"))
+        # CSQ values map positionally onto the header layout; extra values are dropped
+        for append, value in zip(csq_appends, first_csq):
+            append(value)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = VariantBatch(project_id, month, csq_order)
+            (
+        (add_chrom, add_pos, add_ref, add_alt, add_variant_id, add_rsid, add_qual, add_filters),
+        csq_appends,
+    ) = batch.appenders()
+
+    if len(batch):
+        yield batch
+
+
+def make_client(opensearch_url: str) -> OpenSearch:
+    return OpenSearch(
+        hosts=[opensearch_url],
+        verify_certs=False,
+        http_compress=True,
+        pool_maxsize=16,
+        retry_on_timeout=True,
+        max_retries=2,
+        serializer=OrjsonSerializer(),
     )
-    helpers.bulk(client, actions, chunk_size=2000, request_timeout=120)
+
+
+# Per-process state of pool workers, set up by _init_worker
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(args: argparse.Namespace, csq_order: List[str], month: str, bulk_threads: int):
+    writer = DatasetWriter(args.out_root, args.project_id)
+    # pool workers leave through multiprocessing's exit hooks, which run this
+    # and close the worker's Parquet files
+    multiprocessing.util.Finalize(writer, writer.close, exitpriority=10)
+    _worker_state.update(
+        args=args,
+        csq_order=csq_order,
+        month=month,
+        bulk_threads=bulk_threads,
+        writer=writer,
+        client=make_client(args.opensearch_url),
+    )
+
+
+def _ingest_morsel(block: bytes) -> int:
+    # parse one block of lines, append it to this worker's Parquet files and index it
+    state = _worker_state
+    args = state["args"]
+    batches = parse_vcf_body(block.splitlines(), state["csq_order"], args.project_id, state["month"], args.batch_size)
+    failed = index_opensearch(
+        args.project_id,
+        write_batches(batches, state["writer"]),
+        state["client"],
+        args.index_name,
+        thread_count=state["bulk_threads"],
+    )
+    # each worker sees only a slice of every chromosome, so its partitions rarely
+    # fill a row group; write the morsel out rather than holding it until shutdown
+    state["writer"].flush()
+    return failed
+
+
+def ingest_parallel(fh, args: argparse.Namespace, csq_order: List[str], month: str) -> int:
+    """Fan blocks of VCF lines out to worker processes; returns the number of failed docs.
+
+    Each worker owns its own Parquet writer and OpenSearch client, so parsing,
+    Parquet encoding and bulk indexing all run in parallel.
+    """
+    failed = 0
+    pending = set()
+    # parallel_bulk needs at least one thread, so with more workers than
+    # --bulk-threads the floor wins and up to `workers` bulk requests run at once
+    bulk_threads = max(1, args.bulk_threads // args.workers)
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(args, csq_order, month, bulk_threads),
+    ) as pool:
+        for block in iter_line_blocks(fh, MORSEL_SIZE):
+            # bound the number of blocks held in memory
+            if len(pending) >= 2 * args.workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                failed += sum(f.result() for f in done)
+            pending.add(pool.submit(_ingest_morsel, block))
+        failed += sum(f.result() for f in wait(pending).done)
+    return failed
 
 
 def main():
     args = parse_args()
     os.makedirs(os.path.join(args.out_root, args.project_id), exist_ok=True)
 
-    client = OpenSearch(hosts=[args.opensearch_url], verify_certs=False)
-    # ensure index exists
-    try:
-        from genomics_api.index_bootstrap import ensure_index
-    except Exception:
-        ensure_index = None  # type: ignore
-    if ensure_index is not None:
-        ensure_index(client, f"{args.index_name}-{args.project_id}".lower())
+    client = make_client(args.opensearch_url)
+    # docs go to the versioned index; readers stay on the project alias until
+    # both this ingest and the backfill from the previous index have finished
+    index = index_for_project(args.index_name, args.project_id)
+    alias = alias_for_project(args.index_name, args.project_id)
+    ensure_index(client, index)
+    backfill_task = start_backfill(client, alias, index)
     month = datetime.utcnow().strftime("%Y_%m")
 
-    batch_records: List[Dict[str, object]] = []
-    batch_docs: List[Dict[str, object]] = []
-
     with open_maybe_gzip(args.vcf) as fh:
         # parse header to get CSQ order
-        header, csq_order = parse_header_for_csq_order(fh)
+        header, csq_order = parse_header_for_csq_order(read_header_lines(fh))
         if not csq_order:
             print("ERROR: CSQ layout not found in header", file=sys.stderr)
             sys.exit(2)
         # continue reading from after header
-        for line in fh:
-            if not line or line.startswith("#"):
-                continue
-            cols = line.rstrip("\n").split("\t")
-            chrom, pos, _id, ref, alt, qual, flt, info = cols[:8]
-            pos_i = int(pos)
-            info_map = dict(kv.split("=", 1) if "=" in kv else (kv, True) for kv in info.split(";") if kv)
-            csqs = info_map.get(CSQ_KEY, "").split(",") if info_map.get(CSQ_KEY) else []
-            first_csq = csqs[0].split("|") if csqs else []
-            csq = {csq_order[i]: (first_csq[i] if i < len(first_csq) else None) for i in range(len(csq_order))}
-
-            variant_id = compute_variant_id(chrom, pos, ref, alt)
-            record = {
-                "project_id": args.project_id,
-                "chrom": chrom,
-                "pos": pos_i,
-                "ref": ref,
-                "alt": alt,
-                "variant_id": variant_id,
-                "rsid": _id if _id != "." else None,
-                "qual": float(qual) if qual not in (".", "") else None,
-                "filters": flt,
-                "csq": csq,
-                "year_month": month,
-            }
-            batch_records.append(record)
-            # minimal index doc
-            doc = {
-                "variant_id": variant_id,
-                "chrom": chrom,
-                "pos": pos_i,
-                "csq": {
-                    "symbol": csq.get("SYMBOL"),
-                    "consequence": csq.get("Consequence"),
-                    "impact": csq.get("IMPACT"),
-                },
-                "clinvar": {},
-                "population": {},
-            }
-            batch_docs.append(doc)
-
-            if len(batch_records) >= args.batch_size:
-                write_parquet(args.project_id, batch_records, args.out_root)
-                index_opensearch(args.project_id, batch_docs, client, args.index_name)
-                batch_records.clear()
-                batch_docs.clear()
-
-    if batch_records:
-        write_parquet(args.project_id, batch_records, args.out_root)
-        index_opensearch(args.project_id, batch_docs, client, args.index_name)
+        if args.workers > 1:
+            failed = ingest_parallel(fh, args, csq_order, month)
+        else:
+            with DatasetWriter(args.out_root, args.project_id) as writer:
+                lines = (line for block in iter_line_blocks(fh) for line in block.splitlines())
+                batches = parse_vcf_body(lines, csq_order, args.project_id, month, args.batch_size)
+                failed = index_opensearch(
+                    args.project_id,
+                    write_batches(batches, writer),
+                    client,
+                    args.index_name,
+                    thread_count=args.bulk_threads,
+                )
 
-    print("Ingest completed")
\ No newline at end of file
+    if failed:
+        print(f"ERROR: {failed} documents failed to index", file=sys.stderr)
+        sys.exit(1)
+    if backfill_task is not None and not wait_for_backfill(client, backfill_task):
+        sys.exit(1)
+    point_alias(client, alias, index)
+    print("Ingest completed")
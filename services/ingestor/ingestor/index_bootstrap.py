@@ -0,0 +1,108 @@
+import sys
+import time
+from typing import List, Optional
+
+from opensearchpy import OpenSearch
+
+# Bumped whenever MAPPINGS changes. Ingests write to <base>-<version>-<project>;
+# readers only use the <base>-<project> alias, which is repointed once the
+# versioned index is complete.
+INDEX_VERSION = "v2"
+
+# Facet fields keep doc values (the default, stated explicitly) and load global
+# ordinals at refresh time instead of on the first aggregation
+FACET_KEYWORD = {"type": "keyword", "doc_values": True, "eager_global_ordinals": True}
+
+MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "variant_id": {"type": "keyword"},
+            "chrom": {"type": "keyword"},
+            "pos": {"type": "integer"},
+            "csq": {
+                "properties": {
+                    "symbol": FACET_KEYWORD,
+                    "consequence": FACET_KEYWORD,
+                    "impact": {"type": "keyword"}
+                }
+            },
+            "clinvar": {
+                "properties": {
+                    "clinsig": FACET_KEYWORD,
+                    "review_status": {"type": "keyword"}
+                }
+            },
+            "population": {
+                "properties": {
+                    "gnomad_af": {"type": "float"},
+                    "gnomad_popmax_af": {"type": "float"},
+                    "gnomad_popmax_pop": {"type": "keyword"}
+                }
+            }
+        }
+    }
+}
+
+
+def index_for_project(index_name: str, project_id: str) -> str:
+    return f"{index_name}-{INDEX_VERSION}-{project_id}".lower()
+
+
+def alias_for_project(index_name: str, project_id: str) -> str:
+    # before the first versioned ingest this name is a plain (legacy) index
+    return f"{index_name}-{project_id}".lower()
+
+
+def ensure_index(client: OpenSearch, name: str):
+    if not client.indices.exists(index=name):
+        client.indices.create(index=name, body=MAPPINGS)
+
+
+def start_backfill(client: OpenSearch, alias: str, name: str) -> Optional[str]:
+    """Copy docs from whatever `alias` resolves to into `name` as a background task.
+
+    Returns the task id, or None when there is nothing to copy.
+    """
+    if not client.indices.exists(index=alias) or client.indices.exists_alias(name=alias, index=name):
+        return None
+    # the ingest bulk-indexes fresh docs into the same index meanwhile, so
+    # "create" keeps old copies from overwriting them and those conflicts are skipped
+    res = client.reindex(
+        body={
+            "source": {"index": alias},
+            "dest": {"index": name, "op_type": "create"},
+            "conflicts": "proceed",
+        },
+        wait_for_completion=False,
+    )
+    return res["task"]
+
+
+def wait_for_backfill(client: OpenSearch, task_id: str, poll_interval: float = 5.0) -> bool:
+    while True:
+        res = client.tasks.get(task_id=task_id)
+        if res.get("completed"):
+            break
+        time.sleep(poll_interval)
+    failures = res.get("error") or res.get("response", {}).get("failures")
+    if failures:
+        print(f"ERROR: backfill task {task_id} failed: {failures}", file=sys.stderr)
+        return False
+    return True
+
+
+def _indices_behind(client: OpenSearch, alias: str) -> List[str]:
+    if client.indices.exists_alias(name=alias):
+        return list(client.indices.get_alias(name=alias))
+    if client.indices.exists(index=alias):
+        return [alias]
+    return []
+
+
+def point_alias(client: OpenSearch, alias: str, name: str):
+    # one atomic _aliases call: readers see either the old index or the complete
+    # new one. Superseded indexes (including a legacy index that holds the alias
+    # name itself) are deleted in the same call.
+    actions: List[dict] = [{"add": {"index": name, "alias": alias}}]
+    actions += [{"remove_index": {"index": old}} for old in _indices_behind(client, alias) if old != name]
+    client.indices.update_aliases(body={"actions": actions})
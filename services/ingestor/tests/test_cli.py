@@ -0,0 +1,153 @@
+import gzip
+import io
+import os
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from ingestor.cli import (
+    DatasetWriter,
+    VariantBatch,
+    iter_line_blocks,
+    open_maybe_gzip,
+    parse_header_for_csq_order,
+    parse_vcf_body,
+    read_header_lines,
+)
+
+CSQ_ORDER = ["Allele", "Consequence", "IMPACT", "SYMBOL"]
+HEADER = (
+    b"##fileformat=VCFv4.2\n"
+    b'##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence annotations from Ensembl VEP. '
+    b'Format: Allele|Consequence|IMPACT|SYMBOL">\n'
+    b"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+)
+
+
+def _parse(lines, batch_size=5000):
+    return list(parse_vcf_body(lines, CSQ_ORDER, "p1", "2026_10", batch_size))
+
+
+def _batch(chrom: str, start: int, n: int) -> VariantBatch:
+    lines = [b"%s\t%d\t.\tA\tG\t.\tPASS\tCSQ=G|x|LOW|S" % (chrom.encode(), pos) for pos in range(start, start + n)]
+    (batch,) = _parse(lines, batch_size=n)
+    return batch
+
+
+def test_read_header_lines_stops_at_first_body_line():
+    """Test that the header read leaves the stream at the first body line."""
+    # arrange:
+    fh = io.BufferedReader(io.BytesIO(HEADER + b"1\t10\t.\tA\tG\t.\tPASS\t.\n"))
+    # act:
+    header, csq_order = parse_header_for_csq_order(read_header_lines(fh))
+    # assert:
+    assert len(header) == 3
+    assert csq_order == CSQ_ORDER
+    assert fh.readline() == b"1\t10\t.\tA\tG\t.\tPASS\t.\n"
+
+
+def test_iter_line_blocks_without_trailing_newline():
+    """Test that blocks end on line boundaries and keep a final unterminated line."""
+    # arrange:
+    data = b"".join(b"line%d\n" % i for i in range(100)) + b"last"
+    # act:
+    blocks = list(iter_line_blocks(io.BytesIO(data), chunk_size=64))
+    # assert:
+    assert b"".join(blocks) == data
+    assert all(block.endswith(b"\n") for block in blocks[:-1])
+    assert blocks[-1].endswith(b"last")
+
+
+def test_parse_vcf_body_fixed_columns():
+    """Test decoding of the fixed VCF columns and the variant ID."""
+    # act:
+    (batch,) = _parse([b"Chr1\t10\trs1\tA\tG\t12.5\tPASS\tDP=3;CSQ=G|x|LOW|S\tGT\t0/1"])
+    # assert:
+    assert batch.chrom == ["Chr1"]
+    assert batch.pos == [10]
+    assert batch.variant_id == ["chr1:10:a>g"]
+    assert batch.rsid == ["rs1"]
+    assert batch.qual == [12.5]
+    assert batch.filters == ["PASS"]
+
+
+def test_parse_vcf_body_csq_layout():
+    """Test that CSQ values are padded, truncated or nulled to the header layout."""
+    # arrange:
+    lines = [
+        b"1\t1\t.\tA\tG\t.\tPASS\tCSQ=G|missense_variant",  # short: padded
+        b"1\t2\t.\tA\tG\t.\tPASS\tDP=3",  # no CSQ: all null
+        b"1\t3\t.\tA\tG\t.\tPASS\tCSQ=G|a|HIGH|S|extra,T|b|LOW|X",  # extra dropped, first entry only
+    ]
+    # act:
+    (batch,) = _parse(lines)
+    # assert:
+    assert batch.rsid == [None, None, None]
+    assert batch.qual == [None, None, None]
+    rows = batch.to_table().column("csq").to_pylist()
+    assert rows[0] == {"Allele": "G", "Consequence": "missense_variant", "IMPACT": None, "SYMBOL": None}
+    assert rows[1] == dict.fromkeys(CSQ_ORDER)
+    assert rows[2] == {"Allele": "G", "Consequence": "a", "IMPACT": "HIGH", "SYMBOL": "S"}
+
+
+def test_parse_vcf_body_batches():
+    """Test that variants are yielded in batch_size batches plus a remainder."""
+    # arrange:
+    lines = [b"1\t%d\t.\tA\tG\t.\tPASS\t." % pos for pos in range(1, 8)]
+    # act:
+    batches = _parse(lines, batch_size=3)
+    # assert:
+    assert [len(b) for b in batches] == [3, 3, 1]
+
+
+def test_gzip_file_keeps_first_and_last_body_lines(tmp_path: Path):
+    """Test reading a gzipped VCF end to end, without a trailing newline."""
+    # arrange:
+    path = tmp_path / "in.vcf.gz"
+    body = b"\n".join(b"1\t%d\t.\tA\tG\t.\tPASS\tCSQ=G|x|LOW|S" % pos for pos in range(1, 1001))
+    with gzip.open(path, "wb") as out:
+        out.write(HEADER + body)
+    # act:
+    with open_maybe_gzip(str(path)) as fh:
+        _, csq_order = parse_header_for_csq_order(read_header_lines(fh))
+        lines = (line for block in iter_line_blocks(fh, chunk_size=4096) for line in block.splitlines())
+        batches = list(parse_vcf_body(lines, csq_order, "p1", "2026_10", 300))
+    # assert:
+    positions = [pos for batch in batches for pos in batch.pos]
+    assert positions == list(range(1, 1001))
+
+
+def test_dataset_writer_hive_layout(tmp_path: Path):
+    """Test row counts per partition and the chrom=/year_month= directory layout."""
+    # act:
+    with DatasetWriter(str(tmp_path), "p1", row_group_size=100) as writer:
+        writer.write(_batch("1", 1, 150))
+        writer.write(_batch("1", 151, 30))
+        writer.write(_batch("X", 1, 20))
+    # assert:
+    files = sorted(tmp_path.rglob("*.parquet"))
+    assert [f.relative_to(tmp_path).parent.as_posix() for f in files] == [
+        "p1/chrom=1/year_month=2026_10",
+        "p1/chrom=X/year_month=2026_10",
+    ]
+    counts = {f.parent.parent.name: pq.ParquetFile(f).metadata.num_rows for f in files}
+    assert counts == {"chrom=1": 180, "chrom=X": 20}
+    # partition values live in the directory names only
+    assert "chrom" not in pq.read_schema(files[0]).names
+    assert "year_month" not in pq.read_schema(files[0]).names
+
+
+def test_dataset_writer_flushes_finished_partitions(tmp_path: Path):
+    """Test that a new chromosome flushes the buffered rows of the previous one."""
+    # arrange:
+    writer = DatasetWriter(str(tmp_path), "p1", row_group_size=100)
+    # act:
+    writer.write(_batch("1", 1, 40))
+    buffered_before = writer._pending_total
+    writer.write(_batch("2", 1, 10))
+    # assert:
+    assert buffered_before == 40
+    assert writer._pending_total == 10
+    writer.close()
+    assert writer._pending_total == 0
+    assert len(os.listdir(tmp_path / "p1")) == 2
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from ingestor.index_bootstrap import (
+    alias_for_project,
+    index_for_project,
+    point_alias,
+    start_backfill,
+    wait_for_backfill,
+)
+
+
+class FakeIndices:
+    def __init__(self, indices: List[str], aliases: Dict[str, List[str]]):
+        self.indices = indices
+        self.aliases = aliases
+        self.alias_updates: List[Dict[str, Any]] = []
+
+    def exists(self, index: str) -> bool:
+        return index in self.indices or index in self.aliases
+
+    def exists_alias(self, name: str, index: Optional[str] = None) -> bool:
+        return name in self.aliases and (index is None or index in self.aliases[name])
+
+    def get_alias(self, name: str) -> Dict[str, Any]:
+        return {index: {"aliases": {name: {}}} for index in self.aliases[name]}
+
+    def update_aliases(self, body: Dict[str, Any]):
+        self.alias_updates.append(body)
+
+
+class FakeTasks:
+    def __init__(self, responses: List[Dict[str, Any]]):
+        self.responses = responses
+
+    def get(self, task_id: str) -> Dict[str, Any]:
+        return self.responses.pop(0)
+
+
+class FakeClient:
+    def __init__(self, indices=(), aliases=None, task_responses=()):
+        self.indices = FakeIndices(list(indices), dict(aliases or {}))
+        self.tasks = FakeTasks(list(task_responses))
+        self.reindex_calls: List[Dict[str, Any]] = []
+
+    def reindex(self, body: Dict[str, Any], wait_for_completion: bool) -> Dict[str, Any]:
+        assert not wait_for_completion
+        self.reindex_calls.append(body)
+        return {"task": "node:1"}
+
+
+def test_names():
+    """Test the versioned index and alias names."""
+    # act/assert:
+    assert index_for_project("variants", "Proj1") == "variants-v2-proj1"
+    assert alias_for_project("variants", "Proj1") == "variants-proj1"
+
+
+def test_backfill_from_legacy_index():
+    """Test that a legacy index is copied without overwriting freshly ingested docs."""
+    # arrange:
+    client = FakeClient(indices=["variants-p1", "variants-v2-p1"])
+    # act:
+    task = start_backfill(client, "variants-p1", "variants-v2-p1")
+    # assert:
+    assert task == "node:1"
+    assert client.reindex_calls == [
+        {
+            "source": {"index": "variants-p1"},
+            "dest": {"index": "variants-v2-p1", "op_type": "create"},
+            "conflicts": "proceed",
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "indices, aliases",
+    [
+        (["variants-v2-p1"], {}),  # new project
+        (["variants-v2-p1"], {"variants-p1": ["variants-v2-p1"]}),  # re-ingest, same version
+    ],
+)
+def test_no_backfill(indices, aliases):
+    """Test that nothing is copied for a new project or when the alias already points at the index."""
+    # arrange:
+    client = FakeClient(indices=indices, aliases=aliases)
+    # act:
+    task = start_backfill(client, "variants-p1", "variants-v2-p1")
+    # assert:
+    assert task is None
+    assert client.reindex_calls == []
+
+
+@pytest.mark.parametrize(
+    "indices, aliases, removed",
+    [
+        (["variants-v2-p1"], {}, []),
+        (["variants-p1", "variants-v2-p1"], {}, ["variants-p1"]),
+        (["variants-v1-p1", "variants-v2-p1"], {"variants-p1": ["variants-v1-p1"]}, ["variants-v1-p1"]),
+        (["variants-v2-p1"], {"variants-p1": ["variants-v2-p1"]}, []),
+    ],
+)
+def test_point_alias(indices, aliases, removed):
+    """Test that the alias is repointed and superseded indexes dropped in one update."""
+    # arrange:
+    client = FakeClient(indices=indices, aliases=aliases)
+    # act:
+    point_alias(client, "variants-p1", "variants-v2-p1")
+    # assert:
+    assert client.indices.alias_updates == [
+        {
+            "actions": [{"add": {"index": "variants-v2-p1", "alias": "variants-p1"}}]
+            + [{"remove_index": {"index": index}} for index in removed]
+        }
+    ]
+
+
+def test_wait_for_backfill():
+    """Test polling the reindex task until it completes."""
+    # arrange:
+    client = FakeClient(
+        task_responses=[{"completed": False}, {"completed": True, "response": {"failures": []}}]
+    )
+    # act:
+    ok = wait_for_backfill(client, "node:1", poll_interval=0)
+    # assert:
+    assert ok
+    assert client.tasks.responses == []
+
+
+def test_wait_for_backfill_failures():
+    """Test that a backfill with failures is reported as failed."""
+    # arrange:
+    client = FakeClient(task_responses=[{"completed": True, "response": {"failures": [{"id": "x"}]}}])
+    # act:
+    ok = wait_for_backfill(client, "node:1", poll_interval=0)
+    # assert:
+    assert not ok
@@ -13,7 +13,7 @@ export default function VariantsPage() {
     const body = {
       project_id: projectId,
       filters: gene
-        ? { op: 'AND', clauses: [{ field: 'csq.symbol.keyword', op: 'term', value: gene }], groups: [] }
+        ? { op: 'AND', clauses: [{ field: 'csq.symbol', op: 'term', value: gene }], groups: [] }
         : undefined,
       page: { size: 50 }
     }